@@ -5,7 +5,10 @@ import sqlite3
 import os
 from datetime import datetime
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'users.db')
+DATABASE_PATH = os.getenv(
+    "AUTH_DATABASE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'users.db')
+)
 
 def get_db():
     """Get database connection"""
@@ -0,0 +1,357 @@
+"""
+Load test for the course assistant API
+
+Starts the OpenAI stub and the FastAPI app on localhost with throwaway data
+directories, drives a weighted mix of requests at a fixed concurrency and
+reports throughput, latency percentiles, time-to-first-token and errors.
+Nothing leaves the machine.
+
+Run from the backend directory:
+    python -m loadtest.run --concurrency 20 --duration 60
+    python -m loadtest.run --mix chat_stream=6,login=2,session_save=2 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+DEFAULT_MIX = "chat_stream=5,chat=1,syllabus=2,login=1,session_save=1"
+
+QUESTIONS = [
+    "When is the midterm exam?",
+    "What modules does the midterm cover?",
+    "How is the final grade calculated?",
+    "When are the assignments due?",
+    "What is the late work policy?",
+    "What is VLOOKUP used for?",
+    "Who is the instructor for this course?",
+    "What topics are covered in Module 2?",
+]
+
+
+class Stats:
+    """Latency, time-to-first-token and error samples for one operation"""
+
+    def __init__(self):
+        self.latencies = []
+        self.ttfts = []
+        self.errors = 0
+        self.error_samples = []
+
+    def record_error(self, message: str):
+        self.errors += 1
+        if len(self.error_samples) < 3:
+            self.error_samples.append(message)
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of the samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation in --mix: {name.strip()}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+# Operations
+async def op_chat_stream(client, user, stats):
+    await _stream(client, "/api/chat", stats)
+
+
+async def op_syllabus(client, user, stats):
+    await _stream(client, "/api/syllabus", stats)
+
+
+async def _stream(client, path, stats):
+    start = time.perf_counter()
+    first = None
+    async with client.stream(
+        "POST", path, json={"question": random.choice(QUESTIONS), "stream": True}
+    ) as response:
+        async for chunk in response.aiter_raw():
+            if first is None and chunk:
+                first = time.perf_counter()
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code}")
+    stats.latencies.append(time.perf_counter() - start)
+    if first is not None:
+        stats.ttfts.append(first - start)
+
+
+async def op_chat(client, user, stats):
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/chat", json={"question": random.choice(QUESTIONS), "stream": False}
+    )
+    response.raise_for_status()
+    stats.latencies.append(time.perf_counter() - start)
+
+
+async def op_login(client, user, stats):
+    start = time.perf_counter()
+    response = await client.post(
+        "/auth/login", json={"username": user["username"], "password": user["password"]}
+    )
+    response.raise_for_status()
+    stats.latencies.append(time.perf_counter() - start)
+
+
+async def op_session_save(client, user, stats):
+    messages = [
+        {"role": "user", "content": random.choice(QUESTIONS)},
+        {"role": "assistant", "content": "x" * random.randint(200, 2000)},
+    ]
+    start = time.perf_counter()
+    response = await client.post(
+        "/auth/sessions/save",
+        json={
+            "session_id": f"{user['username']}-{random.randint(1, 5)}",
+            "title": "Load test session",
+            "messages": json.dumps(messages),
+        },
+        headers={"Authorization": f"Bearer {user['token']}"},
+    )
+    response.raise_for_status()
+    stats.latencies.append(time.perf_counter() - start)
+
+
+OPERATIONS = {
+    "chat_stream": op_chat_stream,
+    "chat": op_chat,
+    "syllabus": op_syllabus,
+    "login": op_login,
+    "session_save": op_session_save,
+}
+
+
+# Setup and driving
+async def register_users(client, count: int):
+    run_id = uuid.uuid4().hex[:8]
+    users = []
+    for i in range(count):
+        user = {"username": f"load-{run_id}-{i}", "password": "load-test-password"}
+        response = await client.post("/auth/register", json={
+            "email": f"{user['username']}@example.com",
+            "username": user["username"],
+            "password": user["password"],
+        })
+        response.raise_for_status()
+        user["token"] = response.json()["access_token"]
+        users.append(user)
+    return users
+
+
+async def drive(base_url: str, concurrency: int, duration: float, weights: dict, user_count: int):
+    stats = {name: Stats() for name in weights}
+    names = list(weights)
+    timeout = httpx.Timeout(120.0)
+    limits = httpx.Limits(max_connections=concurrency + 5, max_keepalive_connections=concurrency + 5)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        users = await register_users(client, user_count)
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                name = random.choices(names, weights=[weights[n] for n in names])[0]
+                try:
+                    await OPERATIONS[name](client, random.choice(users), stats[name])
+                except Exception as e:
+                    stats[name].record_error(f"{type(e).__name__}: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return stats, elapsed
+
+
+def report(stats: dict, elapsed: float) -> dict:
+    rows = {}
+    for name, s in stats.items():
+        total = len(s.latencies) + s.errors
+        rows[name] = {
+            "requests": total,
+            "rps": len(s.latencies) / elapsed,
+            "error_rate": s.errors / total if total else 0.0,
+            "p50_ms": percentile(s.latencies, 50) * 1000,
+            "p95_ms": percentile(s.latencies, 95) * 1000,
+            "p99_ms": percentile(s.latencies, 99) * 1000,
+            "ttft_p50_ms": percentile(s.ttfts, 50) * 1000 if s.ttfts else None,
+            "ttft_p95_ms": percentile(s.ttfts, 95) * 1000 if s.ttfts else None,
+            "error_samples": s.error_samples,
+        }
+
+    print(f"\nElapsed: {elapsed:.1f}s")
+    header = f"{'operation':<14}{'reqs':>7}{'rps':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft50':>9}{'ttft95':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, row in rows.items():
+        ttft50 = f"{row['ttft_p50_ms']:.0f}" if row["ttft_p50_ms"] is not None else "-"
+        ttft95 = f"{row['ttft_p95_ms']:.0f}" if row["ttft_p95_ms"] is not None else "-"
+        print(
+            f"{name:<14}{row['requests']:>7}{row['rps']:>8.1f}{row['error_rate'] * 100:>7.1f}"
+            f"{row['p50_ms']:>9.0f}{row['p95_ms']:>9.0f}{row['p99_ms']:>9.0f}{ttft50:>9}{ttft95:>9}"
+        )
+    total_ok = sum(len(s.latencies) for s in stats.values())
+    print(f"\nTotal: {total_ok / elapsed:.1f} successful requests/s (latencies in ms)")
+    for name, row in rows.items():
+        for sample in row["error_samples"]:
+            print(f"  {name} error: {sample}")
+    return rows
+
+
+# Process management
+def start_process(args, env, cwd):
+    return subprocess.Popen(args, env=env, cwd=cwd)
+
+
+def wait_for_health(url: str, process, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Process serving {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+def start_stack(args, extra_env: dict = None):
+    """
+    Start the OpenAI stub and the app with throwaway data directories
+
+    Returns the app URL and a stack to pass to stop_stack.
+    """
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    stack = {"processes": [], "workdir": workdir}
+    processes = stack["processes"]
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-loadtest-stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "OPENAI_API_BASE": f"{stub_url}/v1",
+        "RAG_EMBEDDING_CTX_CHECK": "0",
+        "RAG_CACHE_PATH": os.path.join(workdir, "rag_cache.db"),
+        "RAG_VECTORSTORE_DIR": os.path.join(workdir, "vectorstore"),
+        "AUTH_DATABASE_PATH": os.path.join(workdir, "users.db"),
+    })
+    env.update(extra_env or {})
+
+    try:
+        stub = start_process([
+            sys.executable, "-m", "loadtest.stub_openai",
+            "--port", str(args.stub_port),
+            "--latency-ms", str(args.latency_ms),
+            "--tokens-per-sec", str(args.tokens_per_sec),
+            "--answer-tokens", str(args.answer_tokens),
+        ], env, BACKEND_DIR)
+        processes.append(stub)
+        wait_for_health(stub_url, stub, 30)
+
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        app = start_process([
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(args.app_port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ], env, BACKEND_DIR)
+        processes.append(app)
+        wait_for_health(base_url, app, 120)
+    except BaseException:
+        stop_stack(stack)
+        raise
+
+    print(f"App ready at {base_url} (stub at {stub_url}, data in {workdir})")
+    return base_url, stack
+
+
+def stop_stack(stack):
+    """Stop the stack's processes and delete its data directory"""
+    for process in reversed(stack["processes"]):
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    shutil.rmtree(stack["workdir"], ignore_errors=True)
+
+
+def add_stack_arguments(parser):
+    """Command line options shared by every tool that starts the stack"""
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Stub time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40,
+                        help="Stub token rate (0 streams tokens without delay)")
+    parser.add_argument("--answer-tokens", type=int, default=150)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the course assistant API")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"Weighted operations, e.g. {DEFAULT_MIX}")
+    parser.add_argument("--users", type=int, default=20, help="Accounts registered before the run")
+    add_stack_arguments(parser)
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Leave the shared answer cache on (off by default so every chat hits the LLM)")
+    parser.add_argument("--target", help="Load an already running app at this URL instead of starting one")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    stack = None
+    base_url = args.target
+
+    try:
+        if base_url is None:
+            base_url, stack = start_stack(args, {
+                "RAG_ANSWER_CACHE": "1" if args.answer_cache else "0",
+            })
+
+        print(f"Running {args.mix} at concurrency {args.concurrency} for {args.duration:.0f}s...")
+        stats, elapsed = asyncio.run(
+            drive(base_url, args.concurrency, args.duration, weights, args.users)
+        )
+        rows = report(stats, elapsed)
+
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump({"config": vars(args), "elapsed_s": elapsed, "operations": rows}, f, indent=2)
+    finally:
+        if stack is not None:
+            stop_stack(stack)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Local stand-in for the OpenAI chat completions and embeddings APIs
+
+Answers are canned text streamed at a configurable token rate after a
+configurable first-token latency. Embeddings are deterministic hashed
+bag-of-words vectors, so similar texts still land near each other.
+
+Run standalone with:
+    python -m loadtest.stub_openai --port 9100 --latency-ms 300 --tokens-per-sec 40
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Configuration (overridable from the command line)
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "300"))
+TOKENS_PER_SEC = float(os.getenv("STUB_TOKENS_PER_SEC", "40"))
+ANSWER_TOKENS = int(os.getenv("STUB_ANSWER_TOKENS", "150"))
+EMBEDDING_DIM = int(os.getenv("STUB_EMBEDDING_DIM", "1536"))
+
+ANSWER_WORDS = (
+    "Based on the course syllabus, the Midterm Exam is on February 28, 2026 "
+    "and covers Modules 1-3. It is worth 20% of the final grade. Assignments "
+    "are due on the dates listed in each module, and late work follows the "
+    "policy described in the course materials."
+).split()
+
+app = FastAPI(title="OpenAI API stub")
+
+
+def token_delay() -> float:
+    """Seconds between streamed tokens; a rate of 0 or less means no delay"""
+    return 1 / TOKENS_PER_SEC if TOKENS_PER_SEC > 0 else 0.0
+
+
+def answer_tokens():
+    """The canned answer split into ANSWER_TOKENS word-sized tokens"""
+    return [
+        ANSWER_WORDS[i % len(ANSWER_WORDS)] + " "
+        for i in range(ANSWER_TOKENS)
+    ]
+
+
+def embed_text(text: str):
+    """Hashed bag-of-words embedding, L2-normalized like OpenAI's"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % EMBEDDING_DIM
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return vector / norm
+
+
+def chunk_payload(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-3.5-turbo")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    tokens = answer_tokens()
+    usage = {
+        "prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in body.get("messages", [])),
+        "completion_tokens": len(tokens),
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+    if body.get("stream"):
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def events():
+            await asyncio.sleep(LATENCY_MS / 1000)
+            yield f"data: {json.dumps(chunk_payload(completion_id, model, {'role': 'assistant', 'content': ''}))}\n\n"
+            for token in tokens:
+                yield f"data: {json.dumps(chunk_payload(completion_id, model, {'content': token}))}\n\n"
+                await asyncio.sleep(token_delay())
+            yield f"data: {json.dumps(chunk_payload(completion_id, model, {}, 'stop'))}\n\n"
+            if include_usage:
+                final = chunk_payload(completion_id, model, {})
+                final["choices"] = []
+                final["usage"] = usage
+                yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(LATENCY_MS / 1000 + len(tokens) * token_delay())
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": "stop",
+        }],
+        "usage": usage,
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    # Accept a string, a list of strings, or token id lists
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    texts = [
+        " ".join(str(t) for t in item) if isinstance(item, list) else item
+        for item in inputs
+    ]
+
+    data = []
+    for index, text in enumerate(texts):
+        vector = embed_text(text)
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+    tokens = sum(len(text.split()) for text in texts)
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-ada-002"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy"}
+
+
+def main():
+    global LATENCY_MS, TOKENS_PER_SEC, ANSWER_TOKENS, EMBEDDING_DIM
+
+    parser = argparse.ArgumentParser(description="Local OpenAI API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS,
+                        help="Delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=TOKENS_PER_SEC,
+                        help="Token rate; 0 streams tokens without delay")
+    parser.add_argument("--answer-tokens", type=int, default=ANSWER_TOKENS)
+    parser.add_argument("--embedding-dim", type=int, default=EMBEDDING_DIM)
+    args = parser.parse_args()
+
+    LATENCY_MS = args.latency_ms
+    TOKENS_PER_SEC = args.tokens_per_sec
+    ANSWER_TOKENS = args.answer_tokens
+    EMBEDDING_DIM = args.embedding_dim
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Bytes on the wire and send syscalls per answer, before and after coalescing
+
+Starts the stack twice: once with the old behaviour (every token flushed on
+its own, no compression) and once with the configured flush policy. For
+each, it reads raw HTTP responses off a socket and counts the wire bytes and
+the chunked-encoding frames. Frames are only a proxy for server writes, so
+when `strace` (or python-ptrace's `strace.py`) is installed the app process
+is also traced and the send syscalls on client connections are counted.
+
+Run from the backend directory:
+    python -m loadtest.wire --answers 10
+    python -m loadtest.wire --flush-bytes 512 --flush-ms 100
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from .run import QUESTIONS, add_stack_arguments, start_stack, stop_stack
+
+
+def raw_post(base_url: str, path: str, payload: dict, accept_gzip: bool = False) -> dict:
+    """POST over a plain socket and measure exactly what came back"""
+    url = urlparse(base_url)
+    body = json.dumps(payload).encode("utf-8")
+    request = (
+        f"POST {path} HTTP/1.1\r\n"
+        f"Host: {url.hostname}:{url.port}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        + ("Accept-Encoding: gzip\r\n" if accept_gzip else "")
+        + "Connection: close\r\n\r\n"
+    ).encode("ascii") + body
+
+    data = bytearray()
+    with socket.create_connection((url.hostname, url.port)) as sock:
+        sock.sendall(request)
+        while True:
+            part = sock.recv(65536)
+            if not part:
+                break
+            data += part
+
+    head, _, rest = bytes(data).partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    chunked = b"transfer-encoding: chunked" in head.lower()
+    return {
+        "status": status,
+        "wire_bytes": len(data),
+        "frames": count_chunks(rest) if chunked else 1,
+    }
+
+
+def count_chunks(body: bytes) -> int:
+    """Count the non-empty chunks in a chunked transfer-encoded body"""
+    count = 0
+    position = 0
+    while position < len(body):
+        line_end = body.index(b"\r\n", position)
+        size = int(body[position:line_end].split(b";")[0], 16)
+        if size == 0:
+            break
+        count += 1
+        position = line_end + 2 + size + 2
+    return count
+
+
+# Syscalls that put response bytes on a socket, plus those that track which
+# file descriptors are client connections
+SEND_SYSCALLS = ("sendto", "sendmsg", "write", "writev")
+TRACED_SYSCALLS = ("accept", "accept4", "close") + SEND_SYSCALLS
+
+# Matches strace ("123 name(" / "[pid 123] name(") and strace.py ("[123] name(")
+TRACE_LINE = re.compile(r"^\s*(?:\[(?:pid\s+)?\d+\]\s*|\d+\s+)?(\w+)\((\d+)")
+TRACE_RESULT = re.compile(r"\)\s*=\s*(\d+)")
+
+
+def tracer_command(pid: int, output: str):
+    """Command that traces the app's socket syscalls, or None if no tracer is installed"""
+    if shutil.which("strace"):
+        return ["strace", "-f", "-qq", "-e", "trace=" + ",".join(TRACED_SYSCALLS),
+                "-p", str(pid), "-o", output]
+    if shutil.which("strace.py"):
+        return ["strace.py", "-f", "-q", "-e", ",".join(TRACED_SYSCALLS),
+                "-p", str(pid), "-o", output]
+    return None
+
+
+def count_send_syscalls(trace_path: str) -> int:
+    """Count send syscalls on accepted (client) connections in a trace"""
+    clients = set()
+    count = 0
+    with open(trace_path, errors="replace") as trace:
+        for line in trace:
+            match = TRACE_LINE.match(line)
+            if not match:
+                continue
+            name, fd = match.group(1), int(match.group(2))
+            if name in ("accept", "accept4"):
+                result = TRACE_RESULT.search(line)
+                if result:
+                    clients.add(int(result.group(1)))
+            elif name == "close":
+                clients.discard(fd)
+            elif name in SEND_SYSCALLS and fd in clients:
+                count += 1
+    return count
+
+
+def run_kind(base_url: str, answers: int, stream: bool, app_pid: int = None):
+    """Ask `answers` questions one way, tracing the app while doing so"""
+    tracer = None
+    trace_path = None
+    command = None
+    if app_pid is not None:
+        handle, trace_path = tempfile.mkstemp(prefix="wire-trace-")
+        os.close(handle)
+        command = tracer_command(app_pid, trace_path)
+    if command:
+        tracer = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(2)  # Let the tracer attach
+
+    samples = []
+    for i in range(answers):
+        question = f"{QUESTIONS[i % len(QUESTIONS)]} ({i}, {'stream' if stream else 'json'})"
+        samples.append(raw_post(
+            base_url, "/api/chat", {"question": question, "stream": stream},
+            accept_gzip=not stream
+        ))
+
+    syscalls = None
+    if tracer is not None:
+        time.sleep(1)
+        tracer.terminate()
+        tracer.wait(timeout=30)
+        syscalls = count_send_syscalls(trace_path)
+        os.remove(trace_path)
+    return samples, syscalls
+
+
+def measure(base_url: str, answers: int, app_pid: int = None) -> dict:
+    summary = {}
+    for kind, stream in (("stream", True), ("json", False)):
+        samples, syscalls = run_kind(base_url, answers, stream, app_pid)
+        ok = [s for s in samples if s["status"] == 200]
+        summary[kind] = {
+            "answers": len(ok),
+            "errors": len(samples) - len(ok),
+            "wire_bytes": sum(s["wire_bytes"] for s in ok) / len(ok) if ok else 0.0,
+            "frames": sum(s["frames"] for s in ok) / len(ok) if ok else 0.0,
+            "syscalls": syscalls / len(samples) if syscalls is not None and samples else None,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure wire bytes and writes per answer")
+    parser.add_argument("--answers", type=int, default=10, help="Answers measured per policy")
+    parser.add_argument("--flush-bytes", type=int, default=256)
+    parser.add_argument("--flush-ms", type=float, default=50)
+    parser.add_argument("--gzip-min-bytes", type=int, default=1024)
+    parser.add_argument("--no-trace", action="store_true",
+                        help="Skip syscall tracing even if strace is installed")
+    add_stack_arguments(parser)
+    # Long enough that the JSON answer crosses the default gzip threshold
+    parser.set_defaults(answer_tokens=400)
+    args = parser.parse_args()
+
+    # A single worker serves requests in the uvicorn process we can attach to
+    trace = not args.no_trace
+    if trace and args.workers != 1:
+        print("Tracing needs --workers 1; skipping syscall counts")
+        trace = False
+    if trace and tracer_command(0, os.devnull) is None:
+        print("Neither strace nor strace.py found; skipping syscall counts")
+        trace = False
+
+    policies = {
+        "per-token": {
+            "STREAM_FLUSH_BYTES": "0",
+            "STREAM_FLUSH_MS": "0",
+            "ANSWER_GZIP_MIN_BYTES": "0",
+        },
+        "coalesced": {
+            "STREAM_FLUSH_BYTES": str(args.flush_bytes),
+            "STREAM_FLUSH_MS": str(args.flush_ms),
+            "ANSWER_GZIP_MIN_BYTES": str(args.gzip_min_bytes),
+        },
+    }
+
+    summaries = {}
+    for name, env in policies.items():
+        env["RAG_ANSWER_CACHE"] = "0"
+        base_url, stack = start_stack(args, env)
+        try:
+            app_pid = stack["processes"][-1].pid if trace else None
+            summaries[name] = measure(base_url, args.answers, app_pid)
+        finally:
+            stop_stack(stack)
+
+    print(
+        f"\n{'policy':<12}{'kind':<8}{'answers':>9}{'errors':>8}"
+        f"{'bytes/answer':>14}{'frames/answer':>15}{'sends/answer':>14}"
+    )
+    for name, summary in summaries.items():
+        for kind, row in summary.items():
+            syscalls = f"{row['syscalls']:.1f}" if row["syscalls"] is not None else "-"
+            print(
+                f"{name:<12}{kind:<8}{row['answers']:>9}{row['errors']:>8}"
+                f"{row['wire_bytes']:>14.0f}{row['frames']:>15.1f}{syscalls:>14}"
+            )
+    print("\nframes = chunked-encoding frames seen by the client (a proxy for writes);")
+    print("sends = traced send syscalls on client connections in the app process")
+
+
+if __name__ == "__main__":
+    main()
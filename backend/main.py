@@ -2,12 +2,14 @@
 FastAPI Backend for WPC300 Course Assistant
 """
 import os
+import gzip
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 import asyncio
 
 # Load environment variables
@@ -18,7 +20,14 @@ if not os.getenv("OPENAI_API_KEY"):
     print("⚠️  WARNING: OPENAI_API_KEY not set!")
     print("Please copy env_template.txt to .env and add your API key")
 
-from rag import get_answer, get_answer_stream, create_vectorstore
+from rag import (
+    get_answer, get_answer_stream, create_vectorstore, get_index_generation,
+    list_sources, unknown_sources, retrieval_cache_stats
+)
+from rag.chain import focus_on_syllabus
+from rag.shared_cache import log_question
+from rag.warmup import warm_up
+from rag.streaming import coalesce_stream
 from auth.routes import router as auth_router
 
 # Initialize FastAPI app
@@ -44,6 +53,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Non-streaming answers at least this large are gzipped when the client
+# accepts it (0 disables). Streams are never compressed so proxies and
+# browsers can render tokens as they arrive.
+ANSWER_GZIP_MIN_BYTES = int(os.getenv("ANSWER_GZIP_MIN_BYTES", "1024"))
+
 # Include auth routes
 app.include_router(auth_router)
 
@@ -52,6 +66,7 @@ app.include_router(auth_router)
 class QuestionRequest(BaseModel):
     question: str
     stream: bool = True
+    sources: Optional[List[str]] = None  # Limit retrieval to these file names
 
 
 class AnswerResponse(BaseModel):
@@ -59,6 +74,40 @@ class AnswerResponse(BaseModel):
     question: str
 
 
+def check_sources(request: QuestionRequest):
+    """Reject `sources` naming documents that are not indexed"""
+    if not request.sources:
+        return
+    unknown = unknown_sources(request.sources)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sources: {', '.join(unknown)}. See /api/sources for indexed documents."
+        )
+
+
+def record_question(question: str, sources=None, doc_type: str = None):
+    """Log a question for warm-up; a failure here never fails the answer"""
+    try:
+        log_question(question, sources, doc_type)
+    except Exception as e:
+        print(f"⚠️  Could not log question: {e}")
+
+
+def answer_response(http_request: Request, answer: AnswerResponse) -> Response:
+    """Serialize an answer, gzipping long ones for clients that accept it"""
+    body = answer.model_dump_json().encode("utf-8")
+    accepts_gzip = "gzip" in http_request.headers.get("accept-encoding", "")
+    
+    if ANSWER_GZIP_MIN_BYTES and len(body) >= ANSWER_GZIP_MIN_BYTES and accepts_gzip:
+        return Response(
+            gzip.compress(body, compresslevel=6),
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+    return Response(body, media_type="application/json", headers={"Vary": "Accept-Encoding"})
+
+
 # Initialize vector store on startup
 @app.on_event("startup")
 async def startup_event():
@@ -93,7 +142,7 @@ async def health_check():
 
 
 @app.post("/api/chat")
-async def chat(request: QuestionRequest):
+async def chat(request: QuestionRequest, http_request: Request, background_tasks: BackgroundTasks):
     """
     Answer a question about the course using RAG
     """
@@ -106,11 +155,15 @@ async def chat(request: QuestionRequest):
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
     
+    check_sources(request)
+    # Written after the response is sent, off the event loop
+    background_tasks.add_task(record_question, request.question, request.sources)
+    
     try:
         if request.stream:
             # Return streaming response
             async def generate():
-                async for chunk in get_answer_stream(request.question):
+                async for chunk in coalesce_stream(get_answer_stream(request.question, request.sources)):
                     yield chunk
             
             return StreamingResponse(
@@ -119,18 +172,23 @@ async def chat(request: QuestionRequest):
             )
         else:
             # Return complete response
-            answer = get_answer(request.question)
-            return AnswerResponse(answer=answer, question=request.question)
+            answer = get_answer(request.question, request.sources)
+            return answer_response(
+                http_request,
+                AnswerResponse(answer=answer, question=request.question)
+            )
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/syllabus")
-async def syllabus_question(request: QuestionRequest):
+async def syllabus_question(request: QuestionRequest, http_request: Request,
+                            background_tasks: BackgroundTasks):
     """
     Answer a question specifically about the syllabus
-    Adds context to focus on syllabus-related queries
+    Adds context to focus on syllabus-related queries and only searches
+    syllabus documents, or the requested sources if any are given
     """
     if not os.getenv("OPENAI_API_KEY"):
         raise HTTPException(
@@ -138,13 +196,17 @@ async def syllabus_question(request: QuestionRequest):
             detail="OpenAI API key not configured. Please add it to .env file."
         )
     
+    check_sources(request)
+    
     # Enhance the question to focus on syllabus
-    enhanced_question = f"Based on the course syllabus: {request.question}"
+    enhanced_question = focus_on_syllabus(request.question)
+    doc_type = None if request.sources else "syllabus"
+    background_tasks.add_task(record_question, enhanced_question, request.sources, doc_type)
     
     try:
         if request.stream:
             async def generate():
-                async for chunk in get_answer_stream(enhanced_question):
+                async for chunk in coalesce_stream(get_answer_stream(enhanced_question, request.sources, doc_type)):
                     yield chunk
             
             return StreamingResponse(
@@ -152,18 +214,48 @@ async def syllabus_question(request: QuestionRequest):
                 media_type="text/plain"
             )
         else:
-            answer = get_answer(enhanced_question)
-            return AnswerResponse(answer=answer, question=request.question)
+            answer = get_answer(enhanced_question, request.sources, doc_type)
+            return answer_response(
+                http_request,
+                AnswerResponse(answer=answer, question=request.question)
+            )
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/sources")
+async def get_sources():
+    """
+    List the indexed documents that can be passed as `sources`
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(
+            status_code=500,
+            detail="OpenAI API key not configured"
+        )
+    
+    try:
+        return {"sources": list_sources()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """
+    Hit rates of this worker's query embedding and retrieval caches
+    """
+    return {"pid": os.getpid(), **retrieval_cache_stats()}
+
+
 @app.post("/api/index")
-async def reindex_documents():
+async def reindex_documents(background_tasks: BackgroundTasks):
     """
     Re-index all documents in the documents folder
     Useful after adding new documents
+    Likely questions are answered in the background afterwards so they are
+    served from cache straight away
     """
     if not os.getenv("OPENAI_API_KEY"):
         raise HTTPException(
@@ -172,8 +264,15 @@ async def reindex_documents():
         )
     
     try:
+        # Publishing the new generation tells every worker to reload
         create_vectorstore(force_recreate=True)
-        return {"status": "success", "message": "Documents re-indexed successfully"}
+        generation = get_index_generation()
+        background_tasks.add_task(warm_up, generation)
+        return {
+            "status": "success",
+            "message": "Documents re-indexed successfully",
+            "generation": generation
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,10 +1,19 @@
 from .chain import get_answer, get_answer_stream, create_rag_chain
-from .embeddings import create_vectorstore, get_retriever
+from .rerank import retrieval_cache_stats
+from .embeddings import (
+    create_vectorstore, get_retriever, get_index_generation, build_filter, list_sources,
+    unknown_sources
+)
 
 __all__ = [
     "get_answer",
     "get_answer_stream", 
     "create_rag_chain",
     "create_vectorstore",
-    "get_retriever"
+    "get_retriever",
+    "get_index_generation",
+    "build_filter",
+    "list_sources",
+    "unknown_sources",
+    "retrieval_cache_stats"
 ]
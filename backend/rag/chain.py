@@ -2,11 +2,13 @@
 RAG Chain for answering questions about the course
 """
 import os
+import json
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from .embeddings import get_retriever
+from .embeddings import get_retriever, get_index_generation, scoped_filter
+from .shared_cache import get_cached_answer, set_cached_answer
 
 # System prompt for the AI assistant
 SYSTEM_PROMPT = """You are an AI teaching assistant for WPC300 - Problem Solving and Actionable Analytics at Arizona State University's W. P. Carey School of Business.
@@ -36,13 +38,23 @@ USER_PROMPT = """Student Question: {question}
 Please provide a helpful response based on the course materials."""
 
 
+def focus_on_syllabus(question: str) -> str:
+    """Enhance a question to focus on the syllabus"""
+    return f"Based on the course syllabus: {question}"
+
+
 def format_docs(docs):
     """Format retrieved documents into a single string"""
     return "\n\n---\n\n".join(doc.page_content for doc in docs)
 
 
-def create_rag_chain():
-    """Create the RAG chain for answering questions"""
+def create_rag_chain(filter: dict = None):
+    """
+    Create the RAG chain for answering questions
+
+    filter is an optional Chroma metadata filter restricting retrieval to
+    part of the corpus (see build_filter).
+    """
     
     # Get the model name from environment
     model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
@@ -60,8 +72,19 @@ def create_rag_chain():
         ("human", USER_PROMPT)
     ])
     
-    # Get the retriever - use more chunks for better context
-    retriever = get_retriever(k=6)
+    # Get the retriever - MMR keeps fewer, less redundant chunks than plain
+    # similarity, which tends to return neighbouring near-duplicate chunks
+    search_type = os.getenv("RAG_SEARCH_TYPE", "mmr")
+    if search_type == "mmr":
+        retriever = get_retriever(
+            k=int(os.getenv("RAG_MMR_K", "4")),
+            search_type="mmr",
+            fetch_k=int(os.getenv("RAG_FETCH_K", "20")),
+            lambda_mult=float(os.getenv("RAG_MMR_LAMBDA", "0.5")),
+            filter=filter
+        )
+    else:
+        retriever = get_retriever(k=int(os.getenv("RAG_TOP_K", "6")), filter=filter)
     
     # Build the chain
     chain = (
@@ -77,14 +100,55 @@ def create_rag_chain():
     return chain
 
 
-def get_answer(question: str) -> str:
-    """Get an answer to a question using RAG"""
-    chain = create_rag_chain()
-    return chain.invoke(question)
+def answer_cache_enabled() -> bool:
+    """Whether answers are shared through the SQLite cache"""
+    return os.getenv("RAG_ANSWER_CACHE", "1") != "0"
+
+
+def _cache_scope(filter) -> str:
+    """Answers retrieved from different subsets of the corpus are cached apart"""
+    return json.dumps(filter, sort_keys=True) if filter else ""
+
 
+def get_answer(question: str, sources=None, doc_type: str = None) -> str:
+    """
+    Get an answer to a question using RAG
 
-async def get_answer_stream(question: str):
+    sources (file names) and doc_type limit which chunks are searched.
+    """
+    filter = scoped_filter(sources, doc_type)
+    scope = _cache_scope(filter)
+    generation = get_index_generation()
+    if answer_cache_enabled():
+        cached = get_cached_answer(question, generation, scope)
+        if cached is not None:
+            return cached
+    
+    chain = create_rag_chain(filter)
+    answer = chain.invoke(question)
+    
+    if answer_cache_enabled():
+        set_cached_answer(question, generation, answer, scope)
+    return answer
+
+
+async def get_answer_stream(question: str, sources=None, doc_type: str = None):
     """Get a streaming answer to a question using RAG"""
-    chain = create_rag_chain()
+    filter = scoped_filter(sources, doc_type)
+    scope = _cache_scope(filter)
+    generation = get_index_generation()
+    if answer_cache_enabled():
+        cached = get_cached_answer(question, generation, scope)
+        if cached is not None:
+            yield cached
+            return
+    
+    chain = create_rag_chain(filter)
+    chunks = []
     async for chunk in chain.astream(question):
+        chunks.append(chunk)
         yield chunk
+    
+    # Only reached when the client read the whole answer
+    if answer_cache_enabled():
+        set_cached_answer(question, generation, "".join(chunks), scope)
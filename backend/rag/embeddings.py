@@ -2,15 +2,67 @@
 Document embedding and vector store management
 """
 import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 from langchain_community.document_loaders import TextLoader, PyPDFLoader, DirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
+from .rerank import MMRRetriever, query_embedding_cache, retrieval_cache
+from .shared_cache import (
+    SQLiteCachedEmbeddings, get_index_state, get_serving_paths, mark_serving,
+    publish_index, unmark_serving
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across workers
+    fcntl = None
 
 # Paths
 DOCUMENTS_DIR = Path(__file__).parent.parent / "documents"
-VECTORSTORE_DIR = Path(__file__).parent.parent / "vectorstore"
+VECTORSTORE_DIR = Path(os.getenv(
+    "RAG_VECTORSTORE_DIR",
+    Path(__file__).parent.parent / "vectorstore"
+))
+
+# Bump when chunk metadata changes so older index generations get rebuilt
+INDEX_SCHEMA_VERSION = 2
+
+# How often a worker re-reads the published generation from SQLite
+GENERATION_CHECK_S = float(os.getenv("RAG_GENERATION_CHECK_MS", "500")) / 1000
+
+# Vector store opened by this worker process, keyed by index generation
+_loaded = {"generation": None, "vectorstore": None, "checked_at": 0.0, "sources": None}
+# Warm-up threads and request handlers both reload _loaded
+_loaded_lock = threading.Lock()
+# Queries in flight per generation, and replaced stores waiting for theirs
+# to finish before they are closed
+_leases = {}
+_retired = {}
+
+
+def document_type(file_path: Path) -> str:
+    """Classify a document by its file name"""
+    if "syllabus" in file_path.stem.lower():
+        return "syllabus"
+    return "pdf" if file_path.suffix.lower() == ".pdf" else "text"
+
+
+def tag_documents(documents, file_path: Path):
+    """Tag loaded pages with the metadata scoped searches filter on"""
+    for document in documents:
+        document.metadata.update({
+            "source": file_path.name,
+            "path": str(file_path),
+            "doc_type": document_type(file_path),
+            "page": int(document.metadata.get("page", 0)),
+        })
+    return documents
 
 
 def load_documents():
@@ -20,29 +72,58 @@ def load_documents():
     # Load text files
     for txt_file in DOCUMENTS_DIR.glob("*.txt"):
         loader = TextLoader(str(txt_file))
-        documents.extend(loader.load())
+        documents.extend(tag_documents(loader.load(), txt_file))
     
     # Load PDF files
     for pdf_file in DOCUMENTS_DIR.glob("*.pdf"):
         loader = PyPDFLoader(str(pdf_file))
-        documents.extend(loader.load())
+        documents.extend(tag_documents(loader.load(), pdf_file))
     
     return documents
 
 
-def create_vectorstore(force_recreate: bool = False):
-    """Create or load the vector store"""
-    
-    embeddings = OpenAIEmbeddings()
-    
-    # Check if vectorstore already exists
-    if VECTORSTORE_DIR.exists() and not force_recreate:
-        print("Loading existing vector store...")
-        return Chroma(
-            persist_directory=str(VECTORSTORE_DIR),
-            embedding_function=embeddings
+def build_filter(sources=None, doc_type: str = None):
+    """Build a Chroma metadata filter, or None to search everything"""
+    clauses = []
+    if sources:
+        sources = sorted(set(sources))
+        clauses.append(
+            {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": sources}}
         )
+    if doc_type:
+        clauses.append({"doc_type": doc_type})
     
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+@contextmanager
+def _build_lock():
+    """Serialize index builds across worker processes"""
+    VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(VECTORSTORE_DIR / ".build.lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_embeddings():
+    """Get the embedding model, backed by the shared SQLite cache"""
+    # Token-length checking needs tiktoken's encoding files, which are
+    # downloaded on first use; RAG_EMBEDDING_CTX_CHECK=0 skips it offline
+    embeddings = OpenAIEmbeddings(
+        check_embedding_ctx_length=os.getenv("RAG_EMBEDDING_CTX_CHECK", "1") != "0"
+    )
+    return SQLiteCachedEmbeddings(embeddings, namespace=embeddings.model)
+
+
+def build_vectorstore() -> int:
+    """Build a new index generation on disk and publish it to all workers"""
     print("Creating new vector store...")
     
     # Load documents
@@ -63,21 +144,225 @@ def create_vectorstore(force_recreate: bool = False):
     chunks = text_splitter.split_documents(documents)
     print(f"Created {len(chunks)} chunks")
     
-    # Create vector store
-    vectorstore = Chroma.from_documents(
+    # Each build gets its own directory, which is never written again once
+    # published, so workers still serving the old generation are unaffected
+    path = VECTORSTORE_DIR / f"gen-{time.time_ns()}-{os.getpid()}"
+    built = Chroma.from_documents(
         documents=chunks,
-        embedding=embeddings,
-        persist_directory=str(VECTORSTORE_DIR)
+        embedding=get_embeddings(),
+        persist_directory=str(path)
     )
+    # Workers (this one included) open the published copy themselves
+    release_vectorstore(built)
+    (path / "schema_version").write_text(str(INDEX_SCHEMA_VERSION))
+    
+    _, previous_path = get_index_state()
+    generation = publish_index(str(path))
     
-    print("Vector store created and persisted!")
-    return vectorstore
+    # Keep every generation a live worker still has open, plus the previous
+    # one, which workers may be about to open but have not recorded yet
+    keep = {Path(served).name for served in get_serving_paths()}
+    keep |= {path.name, Path(previous_path).name if previous_path else None}
+    for old in VECTORSTORE_DIR.glob("gen-*"):
+        if old.name not in keep:
+            shutil.rmtree(old, ignore_errors=True)
+    
+    print(f"Vector store generation {generation} created and persisted!")
+    return generation
+
+
+def release_vectorstore(vectorstore):
+    """
+    Stop the Chroma system behind a vector store
+
+    chromadb caches one system (SQLite connection plus loaded HNSW segments)
+    per persist directory for the life of the process, so a store that is
+    simply dropped is never freed.
+    """
+    client = vectorstore._client
+    if hasattr(client, "close"):
+        client.close()
+        return
+    
+    # chromadb < 1.0 has no close(); drop the cached system directly
+    from chromadb.api.client import SharedSystemClient
+    system = SharedSystemClient._identifier_to_system.pop(client._identifier, None)
+    if system is not None:
+        system.stop()
+
+
+def _is_current(path) -> bool:
+    """Whether a published index exists and has the current chunk metadata"""
+    if path is None:
+        return False
+    marker = Path(path) / "schema_version"
+    return marker.exists() and marker.read_text().strip() == str(INDEX_SCHEMA_VERSION)
+
+
+def create_vectorstore(force_recreate: bool = False):
+    """
+    Create or load the vector store
+
+    Each worker process keeps the published index generation open and
+    reloads it when another worker publishes a newer one. The published
+    generation is re-read at most every RAG_GENERATION_CHECK_MS.
+    """
+    if not force_recreate and _fresh():
+        return _loaded["vectorstore"]
+    
+    with _loaded_lock:
+        if force_recreate:
+            with _build_lock():
+                build_vectorstore()
+            _loaded["checked_at"] = 0.0
+        elif _fresh():
+            # Another thread reloaded while we waited for the lock
+            return _loaded["vectorstore"]
+        
+        now = time.monotonic()
+        generation, path = get_index_state()
+        if _loaded["vectorstore"] is None or _loaded["generation"] != generation:
+            # The schema marker is only read once per newly published generation
+            if not _is_current(path):
+                with _build_lock():
+                    # Another worker may have finished a build while we waited
+                    generation, path = get_index_state()
+                    if not _is_current(path):
+                        build_vectorstore()
+                        generation, path = get_index_state()
+            
+            print(f"Loading vector store generation {generation}...")
+            query_embedding_cache.clear()
+            retrieval_cache.clear()
+            mark_serving(generation, path)
+            previous, previous_generation = _loaded["vectorstore"], _loaded["generation"]
+            _loaded["vectorstore"] = Chroma(
+                persist_directory=path,
+                embedding_function=get_embeddings()
+            )
+            _loaded["generation"] = generation
+            if previous is not None:
+                if _leases.get(previous_generation):
+                    # Closed by the last query still using it
+                    _retired[previous_generation] = previous
+                else:
+                    _close(previous, previous_generation)
+        
+        _loaded["checked_at"] = now
+        return _loaded["vectorstore"]
+
+
+def _fresh() -> bool:
+    """Whether the loaded store was checked against the published generation recently"""
+    return (
+        _loaded["vectorstore"] is not None
+        and time.monotonic() - _loaded["checked_at"] < GENERATION_CHECK_S
+    )
+
+
+def _close(vectorstore, generation):
+    release_vectorstore(vectorstore)
+    unmark_serving(generation)
+
+
+@contextmanager
+def lease_vectorstore(generation: int = None):
+    """
+    Borrow an open vector store for the duration of a query
+
+    Yields (vectorstore, generation). A reload on another thread closes the
+    store it replaced only once every lease on it has ended. If the requested
+    generation is already closed, the current one is leased instead.
+    """
+    create_vectorstore()
+    with _loaded_lock:
+        if generation in _retired:
+            vectorstore = _retired[generation]
+        else:
+            vectorstore, generation = _loaded["vectorstore"], _loaded["generation"]
+        _leases[generation] = _leases.get(generation, 0) + 1
+    try:
+        yield vectorstore, generation
+    finally:
+        with _loaded_lock:
+            _leases[generation] -= 1
+            retired = None
+            if not _leases[generation]:
+                del _leases[generation]
+                retired = _retired.pop(generation, None)
+        if retired is not None:
+            _close(retired, generation)
+
+
+def get_index_generation() -> int:
+    """Get the index generation this worker is serving"""
+    create_vectorstore()
+    with _loaded_lock:
+        return _loaded["generation"]
+
+
+def list_sources():
+    """
+    List the indexed source files with their document type and chunk count
+
+    Computed once per loaded index generation.
+    """
+    with lease_vectorstore() as (vectorstore, generation):
+        cached = _loaded["sources"]
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        
+        sources = {}
+        for metadata in vectorstore._collection.get(include=["metadatas"])["metadatas"]:
+            metadata = metadata or {}
+            name = metadata.get("source")
+            if name:
+                entry = sources.setdefault(name, {"source": name, "doc_type": metadata.get("doc_type"), "chunks": 0})
+                entry["chunks"] += 1
+    listed = sorted(sources.values(), key=lambda entry: entry["source"])
+    _loaded["sources"] = (generation, listed)
+    return listed
+
+
+def unknown_sources(sources) -> list:
+    """The requested source names that are not in the index"""
+    indexed = {entry["source"] for entry in list_sources()}
+    return sorted(set(sources or []) - indexed)
+
+
+def scoped_filter(sources=None, doc_type: str = None):
+    """
+    Build the metadata filter for a scoped search
+
+    If no indexed document has the requested doc_type (say the syllabus is
+    named Course_Outline.pdf), the whole corpus is searched instead of
+    answering from an empty context.
+    """
+    if doc_type and not any(entry["doc_type"] == doc_type for entry in list_sources()):
+        doc_type = None
+    return build_filter(sources, doc_type)
+
 
+def get_retriever(k: int = 4, search_type: str = "similarity", fetch_k: int = 20,
+                  lambda_mult: float = 0.5, filter: dict = None):
+    """
+    Get a retriever from the vector store
 
-def get_retriever(k: int = 4):
-    """Get a retriever from the vector store"""
-    vectorstore = create_vectorstore()
-    return vectorstore.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": k}
+    search_type="mmr" over-fetches fetch_k candidates and re-ranks them
+    locally for relevance and diversity before keeping k; "similarity"
+    keeps the k most relevant. Both cache query embeddings and results
+    per index generation. filter is a Chroma metadata filter (see
+    build_filter) limiting which chunks are searched at all.
+    """
+    generation = get_index_generation()
+    if search_type != "mmr":
+        # Plain top-k by relevance, through the same cached retriever
+        fetch_k, lambda_mult = k, 1.0
+    return MMRRetriever(
+        lease=partial(lease_vectorstore, generation),
+        generation=generation,
+        k=k,
+        fetch_k=max(fetch_k, k),
+        lambda_mult=lambda_mult,
+        filter=filter
     )
@@ -0,0 +1,124 @@
+"""
+Local MMR re-ranking over the vectors already stored in Chroma
+"""
+import json
+import os
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .lru import TTLCache
+from .shared_cache import normalize_question
+
+# Per-process caches keyed on the normalized question and index generation,
+# so repeated questions skip the embedding round-trip and the vector search
+RAG_LRU_SIZE = int(os.getenv("RAG_LRU_SIZE", "1024"))
+RAG_LRU_TTL_S = float(os.getenv("RAG_LRU_TTL_S", "3600"))
+query_embedding_cache = TTLCache(RAG_LRU_SIZE, RAG_LRU_TTL_S)
+retrieval_cache = TTLCache(RAG_LRU_SIZE, RAG_LRU_TTL_S)
+
+
+def retrieval_cache_stats() -> dict:
+    """Hit rates of this worker's query embedding and retrieval caches"""
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+    }
+
+
+def mmr_select(query_vector, candidate_vectors, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Pick k candidate indices by Maximal Marginal Relevance
+
+    Relevance and redundancy are both cosine similarities, computed once as
+    matrix products so the selection loop only does vector max/argmax work.
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if candidates.ndim != 2 or len(candidates) == 0 or k <= 0:
+        return []
+
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    candidates = candidates / np.where(norms == 0, 1.0, norms)
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    k = min(k, len(candidates))
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything already selected
+    redundancy = pairwise[selected[0]].copy()
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+
+    return selected
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    Over-fetch candidates from Chroma, then re-rank them locally with MMR
+
+    The candidate embeddings come back with the query results, so the only
+    embedding call per question is the query itself, and repeated questions
+    skip even that. lambda_mult=1 with fetch_k=k is plain similarity search.
+
+    lease is called for each search and returns a context manager yielding
+    (vectorstore, generation), so the store cannot be closed mid-query.
+    """
+
+    lease: Callable[[], Any]
+    generation: int = 0
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        normalized = normalize_question(query)
+        key = (
+            normalized, self.k, self.fetch_k, self.lambda_mult,
+            json.dumps(self.filter, sort_keys=True), self.generation
+        )
+        documents = retrieval_cache.get(key)
+        if documents is None:
+            documents = self._search(query, normalized)
+            retrieval_cache.set(key, documents)
+        return list(documents)
+
+    def _search(self, query: str, normalized: str) -> List[Document]:
+        with self.lease() as (vectorstore, _):
+            embedding_key = (normalized, self.generation)
+            query_vector = query_embedding_cache.get(embedding_key)
+            if query_vector is None:
+                query_vector = vectorstore.embeddings.embed_query(query)
+                query_embedding_cache.set(embedding_key, query_vector)
+
+            results = vectorstore._collection.query(
+                query_embeddings=[query_vector],
+                n_results=self.fetch_k,
+                where=self.filter,
+                include=["documents", "metadatas", "embeddings"],
+            )
+
+        texts = results["documents"][0]
+        if not texts:
+            return []
+        metadatas = results["metadatas"][0] or [{}] * len(texts)
+        vectors = results["embeddings"][0]
+
+        selected = mmr_select(query_vector, vectors, self.k, self.lambda_mult)
+        return [
+            Document(page_content=texts[i], metadata=metadatas[i] or {})
+            for i in selected
+        ]
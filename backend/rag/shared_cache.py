@@ -0,0 +1,322 @@
+"""
+SQLite-backed cache shared by every worker process
+
+Holds the index generation counter, the generations each worker has open,
+cached answers and cached document embeddings so that `uvicorn --workers N`
+processes see the same state.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CACHE_PATH = os.getenv(
+    "RAG_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'rag_cache.db')
+)
+
+# Logged questions older than this are deleted as new ones are written
+QUESTION_LOG_DAYS = int(os.getenv("QUESTION_LOG_DAYS", "30"))
+
+
+def get_cache_db():
+    """Get cache database connection"""
+    os.makedirs(os.path.dirname(os.path.abspath(CACHE_PATH)), exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_cache_db():
+    """Initialize cache tables"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+
+    # WAL lets readers in other workers proceed while one worker writes
+    cursor.execute('PRAGMA journal_mode=WAL')
+
+    # Single row pointing at the index generation every worker should serve
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS index_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+    # Generations each worker process still has open; their directories
+    # must survive newer builds
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS serving (
+            pid INTEGER NOT NULL,
+            generation INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            PRIMARY KEY (pid, generation)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS answers (
+            key TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL,
+            question TEXT,
+            answer TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key TEXT PRIMARY KEY,
+            vector BLOB NOT NULL
+        )
+    ''')
+
+    # Questions students asked, used to pick what to warm up after a reindex
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS question_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL,
+            normalized TEXT NOT NULL,
+            sources TEXT,
+            doc_type TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_question_log_created_at
+        ON question_log (created_at)
+    ''')
+
+    conn.commit()
+    conn.close()
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different phrasings share a cache key"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def _hash_key(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+# Index generation functions
+def get_index_state():
+    """Get the (generation, path) of the published index, or (0, None)"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT generation, path FROM index_state WHERE id = 1')
+    row = cursor.fetchone()
+    conn.close()
+    return (row["generation"], row["path"]) if row else (0, None)
+
+
+def publish_index(path: str) -> int:
+    """Point every worker at a freshly built index and drop stale answers"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    cursor.execute('SELECT generation FROM index_state WHERE id = 1')
+    row = cursor.fetchone()
+    generation = (row["generation"] if row else 0) + 1
+
+    cursor.execute('''
+        INSERT OR REPLACE INTO index_state (id, generation, path, updated_at)
+        VALUES (1, ?, ?, ?)
+    ''', (generation, path, datetime.utcnow()))
+    cursor.execute('DELETE FROM answers WHERE generation < ?', (generation,))
+
+    conn.commit()
+    conn.close()
+    return generation
+
+
+def mark_serving(generation: int, path: str):
+    """Record that this worker process has a generation open"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT OR REPLACE INTO serving (pid, generation, path) VALUES (?, ?, ?)',
+        (os.getpid(), generation, path)
+    )
+    conn.commit()
+    conn.close()
+
+
+def unmark_serving(generation: int):
+    """Record that this worker process has closed a generation"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        'DELETE FROM serving WHERE pid = ? AND generation = ?',
+        (os.getpid(), generation)
+    )
+    conn.commit()
+    conn.close()
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows; assume it is alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_serving_paths() -> set:
+    """Index directories still open in some live worker, dropping dead workers' rows"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT pid, path FROM serving')
+    rows = cursor.fetchall()
+    dead = {row["pid"] for row in rows if not _process_alive(row["pid"])}
+    if dead:
+        cursor.executemany('DELETE FROM serving WHERE pid = ?', [(pid,) for pid in dead])
+        conn.commit()
+    conn.close()
+    return {row["path"] for row in rows if row["pid"] not in dead}
+
+
+# Answer cache functions
+def get_cached_answer(question: str, generation: int, scope: str = "") -> Optional[str]:
+    """Get a cached answer for this question, search scope and index generation"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT answer FROM answers WHERE key = ? AND generation = ?',
+        (_hash_key(normalize_question(question), scope), generation)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return row["answer"] if row else None
+
+
+def set_cached_answer(question: str, generation: int, answer: str, scope: str = ""):
+    """Save an answer for this question, search scope and index generation"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO answers (key, generation, question, answer)
+        VALUES (?, ?, ?, ?)
+    ''', (_hash_key(normalize_question(question), scope), generation, question, answer))
+    conn.commit()
+    conn.close()
+
+
+# Question log functions
+def log_question(question: str, sources=None, doc_type: str = None):
+    """Record an asked question with the scope it was asked in"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    # Cheap with the created_at index, and keeps the log bounded
+    cursor.execute(
+        'DELETE FROM question_log WHERE created_at < ?',
+        (datetime.utcnow() - timedelta(days=QUESTION_LOG_DAYS),)
+    )
+    cursor.execute('''
+        INSERT INTO question_log (question, normalized, sources, doc_type, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        question,
+        normalize_question(question),
+        json.dumps(sorted(set(sources))) if sources else None,
+        doc_type,
+        datetime.utcnow()
+    ))
+    conn.commit()
+    conn.close()
+
+
+def get_frequent_questions(limit: int, days: int):
+    """Get the most asked (question, sources, doc_type) of the last `days` days"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT MAX(question) AS question, sources, doc_type, COUNT(*) AS asked
+        FROM question_log
+        WHERE created_at >= ?
+        GROUP BY normalized, sources, doc_type
+        ORDER BY asked DESC
+        LIMIT ?
+    ''', (datetime.utcnow() - timedelta(days=days), limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        (row["question"], json.loads(row["sources"]) if row["sources"] else None, row["doc_type"])
+        for row in rows
+    ]
+
+
+# Embedding cache functions
+def get_cached_embeddings(namespace: str, texts: List[str]) -> dict:
+    """Get cached vectors for the given texts, keyed by text"""
+    keys = {_hash_key(namespace, text): text for text in texts}
+    found = {}
+
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    key_list = list(keys)
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(key_list), 500):
+        batch = key_list[start:start + 500]
+        cursor.execute(
+            f'SELECT key, vector FROM embeddings WHERE key IN ({",".join("?" * len(batch))})',
+            batch
+        )
+        for row in cursor.fetchall():
+            found[keys[row["key"]]] = np.frombuffer(row["vector"], dtype=np.float32).tolist()
+    conn.close()
+    return found
+
+
+def set_cached_embeddings(namespace: str, texts: List[str], vectors: List[List[float]]):
+    """Save vectors for the given texts"""
+    conn = get_cache_db()
+    cursor = conn.cursor()
+    cursor.executemany(
+        'INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)',
+        [
+            (_hash_key(namespace, text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+
+class SQLiteCachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only calls the API for documents no worker has embedded"""
+
+    def __init__(self, underlying: Embeddings, namespace: str):
+        self.underlying = underlying
+        self.namespace = namespace
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = get_cached_embeddings(self.namespace, texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+        if missing:
+            vectors = self.underlying.embed_documents(missing)
+            set_cached_embeddings(self.namespace, missing, vectors)
+            cached.update(zip(missing, vectors))
+        return [cached[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Every distinct question would add a row that is never reused, so
+        # query embeddings only live in each worker's bounded LRU
+        return self.underlying.embed_query(text)
+
+
+# Initialize cache database on import
+init_cache_db()
@@ -0,0 +1,83 @@
+"""
+Flush policy for streamed answers
+"""
+import asyncio
+import os
+
+# Buffer tokens until this many characters are pending...
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "256"))
+# ...or the oldest pending token has waited this long
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "50"))
+
+
+async def coalesce_stream(chunks, flush_bytes: int = None, flush_ms: float = None):
+    """
+    Merge small streamed chunks into fewer, larger writes
+
+    The first chunk is always sent straight away so time-to-first-token is
+    unchanged. After that, chunks are buffered until flush_bytes are pending
+    or flush_ms has passed, whichever comes first. Setting both to 0 passes
+    every chunk through as it arrives.
+    """
+    flush_bytes = STREAM_FLUSH_BYTES if flush_bytes is None else flush_bytes
+    flush_ms = STREAM_FLUSH_MS if flush_ms is None else flush_ms
+
+    if flush_bytes <= 0 and flush_ms <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    buffer = []
+    size = 0
+    deadline = None
+    first = True
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = max(0.0, deadline - loop.time()) if buffer and flush_ms > 0 else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Time window expired while waiting for the next token
+                yield "".join(buffer)
+                buffer, size = [], 0
+                continue
+
+            finished, pending = pending, None
+            try:
+                chunk = finished.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # Send what the LLM produced before it failed, then propagate
+                if buffer:
+                    yield "".join(buffer)
+                raise
+
+            if not chunk:
+                continue
+            if first:
+                first = False
+                yield chunk
+                continue
+
+            if not buffer:
+                deadline = loop.time() + flush_ms / 1000
+            buffer.append(chunk)
+            size += len(chunk)
+
+            if flush_bytes > 0 and size >= flush_bytes:
+                yield "".join(buffer)
+                buffer, size = [], 0
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+    if buffer:
+        yield "".join(buffer)
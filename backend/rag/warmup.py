@@ -0,0 +1,84 @@
+"""
+Answer warm-up after a reindex
+
+Runs likely questions through the chain so their answers are already in the
+shared answer cache when the first students ask them.
+"""
+import asyncio
+import os
+from pathlib import Path
+
+from .chain import answer_cache_enabled, focus_on_syllabus, get_answer
+from .embeddings import get_index_generation
+from .shared_cache import get_frequent_questions, normalize_question
+
+WARMUP_QUESTIONS_FILE = Path(os.getenv(
+    "WARMUP_QUESTIONS_FILE",
+    Path(__file__).parent.parent / "warmup_questions.txt"
+))
+# How many of the most asked recent questions to warm up, and from how far back
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+WARMUP_LOG_DAYS = int(os.getenv("WARMUP_LOG_DAYS", "7"))
+# Pause between questions so warm-up never competes with real traffic
+WARMUP_DELAY_S = float(os.getenv("WARMUP_DELAY_S", "1"))
+
+
+def load_configured_questions():
+    """
+    Read the configured warm-up questions
+
+    One question per line; blank lines and lines starting with # are
+    skipped. Lines starting with "syllabus:" are asked the way
+    /api/syllabus asks them.
+    """
+    if not WARMUP_QUESTIONS_FILE.exists():
+        return []
+
+    questions = []
+    for line in WARMUP_QUESTIONS_FILE.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.lower().startswith("syllabus:"):
+            questions.append((focus_on_syllabus(line[len("syllabus:"):].strip()), None, "syllabus"))
+        else:
+            questions.append((line, None, None))
+    return questions
+
+
+def warmup_questions():
+    """Configured questions followed by the most asked recent ones, deduplicated"""
+    questions = []
+    seen = set()
+    for question, sources, doc_type in (
+        load_configured_questions() + get_frequent_questions(WARMUP_TOP_N, WARMUP_LOG_DAYS)
+    ):
+        key = (normalize_question(question), tuple(sorted(sources or [])), doc_type)
+        if key not in seen:
+            seen.add(key)
+            questions.append((question, sources, doc_type))
+    return questions
+
+
+async def warm_up(generation: int):
+    """Answer the warm-up questions for this index generation, one at a time"""
+    if not answer_cache_enabled():
+        return
+
+    questions = warmup_questions()
+    print(f"🔥 Warming up {len(questions)} answers for index generation {generation}...")
+
+    warmed = 0
+    for question, sources, doc_type in questions:
+        if get_index_generation() != generation:
+            print("Newer index published; stopping warm-up")
+            return
+        try:
+            # get_answer blocks, so keep it off the event loop
+            await asyncio.to_thread(get_answer, question, sources, doc_type)
+            warmed += 1
+        except Exception as e:
+            print(f"⚠️  Warm-up failed for {question!r}: {e}")
+        await asyncio.sleep(WARMUP_DELAY_S)
+
+    print(f"✅ Warmed up {warmed} answers")
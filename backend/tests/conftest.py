@@ -0,0 +1,11 @@
+"""
+Shared test setup: import backend modules without touching real data
+"""
+import os
+import sys
+import tempfile
+
+# rag.shared_cache creates its SQLite database on import
+os.environ.setdefault("RAG_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="rag-tests-"), "rag_cache.db"))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
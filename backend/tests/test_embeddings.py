@@ -0,0 +1,172 @@
+"""
+Tests for scoped search filters and for index generations: reloads, leases
+and directory pruning
+"""
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import rag.embeddings as embeddings
+from rag.rerank import query_embedding_cache, retrieval_cache
+
+
+INDEXED = [
+    {"source": "Course_Outline.pdf", "doc_type": "pdf", "chunks": 12},
+    {"source": "notes.txt", "doc_type": "text", "chunks": 3},
+]
+
+
+@pytest.fixture
+def indexed(monkeypatch):
+    """Pretend the index holds INDEXED, with no syllabus-type document"""
+    monkeypatch.setattr(embeddings, "list_sources", lambda: INDEXED)
+
+
+def test_build_filter_without_scope_searches_everything():
+    assert embeddings.build_filter() is None
+    assert embeddings.build_filter([], None) is None
+
+
+def test_build_filter_single_source():
+    assert embeddings.build_filter(["notes.txt"]) == {"source": "notes.txt"}
+
+
+def test_build_filter_several_sources_are_deduplicated_and_sorted():
+    assert embeddings.build_filter(["notes.txt", "Course_Outline.pdf", "notes.txt"]) == {
+        "source": {"$in": ["Course_Outline.pdf", "notes.txt"]}
+    }
+
+
+def test_build_filter_sources_and_doc_type():
+    assert embeddings.build_filter(["notes.txt"], "text") == {
+        "$and": [{"source": "notes.txt"}, {"doc_type": "text"}]
+    }
+    assert embeddings.build_filter(None, "syllabus") == {"doc_type": "syllabus"}
+
+
+def test_scoped_filter_keeps_an_indexed_doc_type(indexed):
+    assert embeddings.scoped_filter(None, "pdf") == {"doc_type": "pdf"}
+
+
+def test_scoped_filter_falls_back_when_no_document_has_the_doc_type(indexed):
+    assert embeddings.scoped_filter(None, "syllabus") is None
+    assert embeddings.scoped_filter(["notes.txt"], "syllabus") == {"source": "notes.txt"}
+
+
+def test_unknown_sources(indexed):
+    assert embeddings.unknown_sources(["notes.txt"]) == []
+    assert embeddings.unknown_sources(["notes.txt", "missing.pdf", "other.txt"]) == [
+        "missing.pdf", "other.txt"
+    ]
+    assert embeddings.unknown_sources(None) == []
+
+
+class SlowQueryEmbedding(DeterministicFakeEmbedding):
+    """Fake embeddings whose query call is slow enough for a reload to land mid-search"""
+
+    def embed_query(self, text):
+        time.sleep(0.02)
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """A small corpus and an empty vector store directory, with a fresh worker state"""
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    (documents / "syllabus.txt").write_text(
+        "The Midterm Exam is on February 28 and covers Modules 1-3.\n\n"
+        "Assignments are due at the end of each module."
+    )
+    (documents / "notes.txt").write_text("Module 4 covers regression and forecasting.")
+
+    monkeypatch.setattr(embeddings, "DOCUMENTS_DIR", documents)
+    monkeypatch.setattr(embeddings, "VECTORSTORE_DIR", tmp_path / "vectorstore")
+    monkeypatch.setattr(embeddings, "get_embeddings", lambda: SlowQueryEmbedding(size=16))
+    monkeypatch.setattr(embeddings, "GENERATION_CHECK_S", 0.0)
+    monkeypatch.setattr(embeddings, "_loaded", {
+        "generation": None, "vectorstore": None, "checked_at": 0.0, "sources": None
+    })
+    monkeypatch.setattr(embeddings, "_leases", {})
+    monkeypatch.setattr(embeddings, "_retired", {})
+    # Every retrieval must reach the store
+    monkeypatch.setattr(query_embedding_cache, "maxsize", 0)
+    monkeypatch.setattr(retrieval_cache, "maxsize", 0)
+
+    embeddings.create_vectorstore(force_recreate=True)
+    yield tmp_path / "vectorstore"
+    for generation in list(embeddings._retired):
+        embeddings._close(embeddings._retired.pop(generation), generation)
+    embeddings._close(embeddings._loaded["vectorstore"], embeddings._loaded["generation"])
+
+
+def test_leased_store_stays_open_across_reload(index):
+    with embeddings.lease_vectorstore() as (vectorstore, generation):
+        embeddings.create_vectorstore(force_recreate=True)
+
+        assert embeddings.get_index_generation() > generation
+        assert generation in embeddings._retired
+        assert vectorstore._collection.count() > 0
+
+    assert embeddings._retired == {}
+    assert embeddings._leases == {}
+
+
+def test_concurrent_retrievals_across_reloads(index):
+    stop = threading.Event()
+    errors = []
+    answered = []
+
+    def ask():
+        while not stop.is_set():
+            try:
+                retriever = embeddings.get_retriever(k=2, search_type="mmr", fetch_k=4)
+                answered.append(len(retriever.invoke("When is the midterm exam?")))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=ask) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(5):
+            # Another worker publishes; the asking threads reload on their own
+            with embeddings._build_lock():
+                embeddings.build_vectorstore()
+            time.sleep(0.1)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    assert answered and all(count == 2 for count in answered)
+    assert embeddings._retired == {}
+    assert embeddings._leases == {}
+
+
+def test_pruning_keeps_generations_still_served(index):
+    with embeddings.lease_vectorstore() as (_, generation):
+        served = Path(embeddings.get_index_state()[1]).name
+        for _ in range(3):
+            embeddings.create_vectorstore(force_recreate=True)
+
+        # Three builds later the leased generation's directory is still there
+        assert (index / served).exists()
+        assert generation in embeddings._retired
+
+    embeddings.create_vectorstore(force_recreate=True)
+    assert not (index / served).exists()
+    assert len(list(index.glob("gen-*"))) == 2
+
+
+def test_sources_are_tagged_when_indexed(index):
+    listed = embeddings.list_sources()
+
+    assert [(entry["source"], entry["doc_type"]) for entry in listed] == [
+        ("notes.txt", "text"), ("syllabus.txt", "syllabus")
+    ]
+    assert embeddings.scoped_filter(None, "syllabus") == {"doc_type": "syllabus"}
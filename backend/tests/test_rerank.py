@@ -0,0 +1,40 @@
+"""
+Tests for local MMR re-ranking
+"""
+import numpy as np
+import pytest
+
+from rag.rerank import mmr_select
+
+
+def cosine_top_k(query, candidates, k):
+    query = query / np.linalg.norm(query)
+    candidates = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    return list(np.argsort(-(candidates @ query))[:k])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lambda_one_is_top_k_by_cosine(seed):
+    rng = np.random.default_rng(seed)
+    query = rng.normal(size=32)
+    candidates = rng.normal(size=(20, 32)) * rng.uniform(0.1, 10, size=(20, 1))
+
+    assert mmr_select(query, candidates, k=5, lambda_mult=1.0) == cosine_top_k(query, candidates, 5)
+
+
+def test_low_lambda_skips_near_duplicates():
+    query = [1.0, 0.0, 0.0]
+    candidates = [
+        [1.0, 0.1, 0.0],
+        [1.0, 0.11, 0.0],  # Near duplicate of the first
+        [0.7, 0.0, 0.7],
+    ]
+
+    assert mmr_select(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(query, candidates, k=2, lambda_mult=0.3) == [0, 2]
+
+
+def test_k_larger_than_candidates_and_empty_input():
+    assert sorted(mmr_select([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]], k=5)) == [0, 1]
+    assert mmr_select([1.0, 0.0], [], k=3) == []
+    assert mmr_select([1.0, 0.0], [[1.0, 0.0]], k=0) == []
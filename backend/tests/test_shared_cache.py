@@ -0,0 +1,73 @@
+"""
+Tests for the question log behind answer warm-up
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import rag.shared_cache as shared_cache
+from rag.shared_cache import get_cache_db, get_frequent_questions, log_question
+
+
+@pytest.fixture(autouse=True)
+def empty_log():
+    conn = get_cache_db()
+    conn.execute('DELETE FROM question_log')
+    conn.commit()
+    conn.close()
+
+
+def log_at(question: str, days_ago: float, sources=None, doc_type=None):
+    """Insert a logged question as if it had been asked days_ago days ago"""
+    conn = get_cache_db()
+    conn.execute(
+        'INSERT INTO question_log (question, normalized, sources, doc_type, created_at) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (question, shared_cache.normalize_question(question), sources, doc_type,
+         datetime.utcnow() - timedelta(days=days_ago))
+    )
+    conn.commit()
+    conn.close()
+
+
+def logged_questions():
+    conn = get_cache_db()
+    rows = conn.execute('SELECT question FROM question_log ORDER BY id').fetchall()
+    conn.close()
+    return [row["question"] for row in rows]
+
+
+def test_frequent_questions_group_phrasings_and_scopes():
+    for _ in range(3):
+        log_question("When is the midterm?")
+    log_question("when is the  MIDTERM")
+    log_question("What is the late policy?", ["notes.txt"])
+    log_question("What is the late policy?", ["notes.txt"])
+    log_question("When is the midterm?", ["notes.txt"])
+
+    top = get_frequent_questions(limit=10, days=7)
+    # One phrasing of each group is kept
+    assert [(shared_cache.normalize_question(q), s, d) for q, s, d in top] == [
+        ("when is the midterm", None, None),
+        ("what is the late policy", ["notes.txt"], None),
+        ("when is the midterm", ["notes.txt"], None),
+    ]
+    assert len(get_frequent_questions(limit=2, days=7)) == 2
+
+
+def test_frequent_questions_only_look_back_days():
+    log_at("Old question", days_ago=8)
+    log_at("Old question", days_ago=8)
+    log_at("Recent question", days_ago=6)
+
+    assert get_frequent_questions(limit=10, days=7) == [("Recent question", None, None)]
+    assert len(get_frequent_questions(limit=10, days=9)) == 2
+
+
+def test_log_question_prunes_old_entries(monkeypatch):
+    monkeypatch.setattr(shared_cache, "QUESTION_LOG_DAYS", 30)
+    log_at("Last term", days_ago=31)
+    log_at("Last month", days_ago=29)
+    log_question("Today")
+
+    assert logged_questions() == ["Last month", "Today"]
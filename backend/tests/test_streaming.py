@@ -0,0 +1,72 @@
+"""
+Tests for the streamed answer flush policy
+"""
+import asyncio
+import time
+
+import pytest
+
+from rag.streaming import coalesce_stream
+
+
+async def tokens(*items, delays=None):
+    """Yield items, sleeping delays[i] seconds before item i"""
+    for i, item in enumerate(items):
+        await asyncio.sleep((delays or {}).get(i, 0))
+        yield item
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_first_token_is_sent_immediately():
+    async def run():
+        stream = coalesce_stream(tokens("a", "b", delays={1: 1.0}), flush_bytes=1000, flush_ms=500)
+        first = await asyncio.wait_for(stream.__anext__(), timeout=0.2)
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == "a"
+
+
+def test_flushes_when_size_reached():
+    stream = coalesce_stream(tokens("ab", "cd", "ef", "gh"), flush_bytes=4, flush_ms=0)
+    assert asyncio.run(collect(stream)) == ["ab", "cdef", "gh"]
+
+
+def test_flushes_on_timer_when_upstream_stalls():
+    async def run():
+        start = time.monotonic()
+        arrivals = []
+        stream = coalesce_stream(tokens("a", "b", "c", delays={2: 0.5}), flush_bytes=1000, flush_ms=50)
+        async for chunk in stream:
+            arrivals.append((chunk, time.monotonic() - start))
+        return arrivals
+
+    arrivals = asyncio.run(run())
+    assert [chunk for chunk, _ in arrivals] == ["a", "b", "c"]
+    # "b" is sent when the window expires, not when "c" finally arrives
+    assert arrivals[1][1] < 0.3
+    assert arrivals[2][1] >= 0.5
+
+
+def test_zero_settings_pass_every_chunk_through():
+    stream = coalesce_stream(tokens("a", "b", "c"), flush_bytes=0, flush_ms=0)
+    assert asyncio.run(collect(stream)) == ["a", "b", "c"]
+
+
+def test_buffered_tokens_are_sent_before_upstream_error():
+    async def failing():
+        yield "a"
+        yield "b"
+        raise ValueError("LLM failed")
+
+    async def run():
+        received = []
+        with pytest.raises(ValueError, match="LLM failed"):
+            async for chunk in coalesce_stream(failing(), flush_bytes=1000, flush_ms=1000):
+                received.append(chunk)
+        return received
+
+    assert asyncio.run(run()) == ["a", "b"]
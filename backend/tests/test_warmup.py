@@ -0,0 +1,53 @@
+"""
+Tests for choosing the questions warmed up after a reindex
+"""
+import pytest
+
+import rag.warmup as warmup
+from rag.chain import focus_on_syllabus
+
+
+@pytest.fixture
+def questions_file(tmp_path, monkeypatch):
+    path = tmp_path / "warmup_questions.txt"
+    monkeypatch.setattr(warmup, "WARMUP_QUESTIONS_FILE", path)
+    return path
+
+
+def test_missing_file_has_no_questions(questions_file):
+    assert warmup.load_configured_questions() == []
+
+
+def test_parses_plain_and_syllabus_questions(questions_file):
+    questions_file.write_text(
+        "# Asked every term\n"
+        "\n"
+        "  What is the late policy?  \n"
+        "syllabus: When is the midterm?\n"
+        "SYLLABUS:How are grades weighted?\n"
+    )
+
+    assert warmup.load_configured_questions() == [
+        ("What is the late policy?", None, None),
+        (focus_on_syllabus("When is the midterm?"), None, "syllabus"),
+        (focus_on_syllabus("How are grades weighted?"), None, "syllabus"),
+    ]
+
+
+def test_deduplicates_by_normalized_question_and_scope(questions_file, monkeypatch):
+    questions_file.write_text("When is the midterm?\nsyllabus: When is the midterm?\n")
+    logged = [
+        ("when is the  MIDTERM", None, None),  # Same as the configured question
+        (focus_on_syllabus("When is the midterm?"), None, "syllabus"),  # Same again
+        ("When is the midterm?", ["notes.txt"], None),  # Different sources
+        ("When is the midterm?", ["a.pdf", "b.pdf"], None),
+        ("When is the midterm?", ["b.pdf", "a.pdf"], None),  # Same sources, other order
+    ]
+    monkeypatch.setattr(warmup, "get_frequent_questions", lambda limit, days: logged)
+
+    assert warmup.warmup_questions() == [
+        ("When is the midterm?", None, None),
+        (focus_on_syllabus("When is the midterm?"), None, "syllabus"),
+        ("When is the midterm?", ["notes.txt"], None),
+        ("When is the midterm?", ["a.pdf", "b.pdf"], None),
+    ]